@@ -3,12 +3,24 @@ planetary aspects"""
 
 from datetime import datetime
 from functools import lru_cache
-from itertools import combinations as combs
+from math import floor
+from os.path import abspath, dirname
+import sys
 from zoneinfo import ZoneInfo
 
-from numpy import array, ndenumerate, where
+from numba import from_dtype, njit, prange, types
+from numpy import (array, ascontiguousarray, dtype, empty, float32, float64,
+                   floor as np_floor, int32, int64, minimum, newaxis)
 import swisseph as swe
 
+if __name__ == '__main__':
+    # Run as a script (python ketu.py) or with python -m ketu.ketu: hand over
+    # to the ketu.ketu package module before any kernel is compiled, so the
+    # numba on-disk cache is always written and read under that module name
+    sys.path[0] = dirname(dirname(abspath(__file__)))
+    from ketu.ketu import main
+    sys.exit(main())
+
 # Structured array of astronomical bodies: Sun, Moon, Mercury, Venus, Mars,
 # Jupiter, Saturn, Uranus, Neptune, Pluto and mean Node aka Rahu,
 # their id's and their orb of influence.
@@ -19,6 +31,10 @@ bodies = array([('Sun', 0, 12), ('Moon', 1, 12), ('Mercury', 2, 8),
                 ('Pluto', 9, 4), ('Rahu', 10, 0)],
                dtype=[('name', 'S12'), ('id', 'i4'), ('orb', 'f4')])
 
+# Bodies id's by name
+body_ids = {name.decode(): int(b_id)
+            for name, b_id in zip(bodies['name'], bodies['id'])}
+
 # Structured array of major aspects (harmonics 2 and 3) and their coefficient
 # for calculation of the orb
 aspects = array([('Conjunction', 0, 1), ('Sextile', 60, 1/3),
@@ -26,6 +42,24 @@ aspects = array([('Conjunction', 0, 1), ('Sextile', 60, 1/3),
                  ('Opposition', 180, 1)],
                 dtype=[('name', 'S12'), ('value', 'f4'), ('coef', 'f4')])
 
+# Aspects names, decoded once for printing
+aspect_names = [name.decode() for name in aspects['name']]
+
+# Orb of influence for each pair of bodies and each aspect, indexed by
+# [body1, body2, aspect]. Aspects tables are kept in float32, precise enough
+# for orbs to the arc second, to halve the memory traffic of the series scan
+orb_table = ascontiguousarray(
+    ((bodies['orb'][:, newaxis] + bodies['orb'][newaxis, :]) / 2
+     )[:, :, newaxis] * aspects['coef'], dtype=float32)
+
+# Contiguous copy of the aspects values for the compiled aspects scan
+aspect_values = ascontiguousarray(aspects['value'], dtype=float32)
+
+# Data type of the aspects found between two bodies: bodies id's, index of
+# the aspect and orb
+aspect_dtype = dtype([('body1', 'i4'), ('body2', 'i4'), ('i_asp', 'i4'),
+                      ('orb', 'f4')])
+
 # List of signs for body position
 signs = ['Aries', 'Taurus', 'Gemini', 'Cancer', 'Leo', 'Virgo', 'Libra',
          'Scorpio', 'Sagittarius', 'Capricorn', 'Aquarius', 'Pisces']
@@ -33,9 +67,14 @@ signs = ['Aries', 'Taurus', 'Gemini', 'Cancer', 'Leo', 'Virgo', 'Libra',
 
 def dd_to_dms(deg):
     """Return degrees, minutes, seconds from degrees decimal"""
-    mins, secs = divmod(deg * 3600, 60)
-    degs, mins = divmod(mins, 60)
-    return array((degs, mins, secs), dtype='i4')
+    total = floor(deg * 3600)
+    return total // 3600, total // 60 % 60, total % 60
+
+
+def dd_to_dms_vec(deg):
+    """Return arrays of degrees, minutes, seconds from degrees decimal"""
+    total = np_floor(deg * 3600).astype(int64)
+    return total // 3600, total // 60 % 60, total % 60
 
 
 def distance(pos1, pos2):
@@ -44,10 +83,25 @@ def distance(pos1, pos2):
     return angle if angle <= 180 else 360 - angle
 
 
+def distance_vec(pos1, pos2):
+    """
+    Return the angular distances from two arrays (or scalars) of bodies
+    positions
+    """
+    angle = abs(pos2 - pos1)
+    return minimum(angle, 360 - angle)
+
+
+@njit(['f4(f4, f4)', 'f8(f8, f8)'], cache=True)
+def _distance(pos1, pos2):
+    """Compiled version of distance for the numba kernels"""
+    angle = abs(pos2 - pos1)
+    return angle if angle <= 180 else 360 - angle
+
+
 def get_orb(body1, body2, asp):
-    """Calculate the orb for two bodies and aspect"""
-    orbs, coef = bodies['orb'], aspects['coef']
-    return (orbs[body1] + orbs[body2])/2 * coef[asp]
+    """Return the orb for two bodies and aspect"""
+    return orb_table[body1, body2, asp]
 
 
 # --------- interface functions with pyswisseph ---------
@@ -72,67 +126,104 @@ def utc_to_julian(dtime):
     return swe.utc_to_jd(year, month, day, hour, minute, second, 1)[1]
 
 
+@lru_cache(maxsize=16)
 def body_name(body):
     """Return the body name"""
-    if swe.get_planet_name(body) == 'mean Node':
-        return 'Rahu'
-    return swe.get_planet_name(body)
+    name = swe.get_planet_name(int(body))
+    return 'Rahu' if name == 'mean Node' else name
+
+
+# Bodies names, indexed by id, for the reports
+body_names = [body_name(body) for body in bodies['id']]
+
+
+@lru_cache(maxsize=4096)
+def all_properties(jdate):
+    """
+    Return the properties (longitude, latitude, distance to Earth in AU,
+    longitude speed, latitude speed, distance speed) of all the bodies as a
+    read-only Numpy array of shape (bodies, 6)
+    """
+    props = array([swe.calc_ut(jdate, int(body))[0] for body in bodies['id']],
+                  dtype=float64)
+    props.flags.writeable = False
+    return props
+
+
+def all_properties_series(jdates):
+    """
+    Return the properties of all the bodies for an array of Julian dates as a
+    Numpy array of shape (dates, bodies, 6)
+    """
+    props = empty((len(jdates), len(bodies), 6), dtype=float64)
+    for i_date, jdate in enumerate(jdates):
+        for body in bodies['id']:
+            props[i_date, body] = swe.calc_ut(float(jdate), int(body))[0]
+    return props
+
+# --------------------------------------------------------
 
 
-@lru_cache()
 def body_properties(jdate, body):
     """
     Return the body properties (longitude, latitude, distance to Earth in AU,
     longitude speed, latitude speed, distance speed) as a Numpy array
     """
-    return array(swe.calc_ut(jdate, body)[0])
-
-# --------------------------------------------------------
+    return all_properties(jdate)[body]
 
 
 def body_id(b_name):
     """Return the body id"""
-    return bodies['id'][where(bodies['name'] == b_name.encode())]
+    return body_ids[b_name]
 
 
 def long(jdate, body):
     """Return the body longitude"""
-    return body_properties(jdate, body)[0]
+    return all_properties(jdate)[body, 0]
 
 
 def lat(jdate, body):
     """Return the body latitude"""
-    return body_properties(jdate, body)[1]
+    return all_properties(jdate)[body, 1]
 
 
 def dist_au(jdate, body):
     """Return distance of the body to Earth in AU"""
-    return body_properties(jdate, body)[2]
+    return all_properties(jdate)[body, 2]
 
 
 def vlong(jdate, body):
     """Return the body longitude speed"""
-    return body_properties(jdate, body)[3]
+    return all_properties(jdate)[body, 3]
 
 
 def vlat(jdate, body):
     """Return the body latitude speed"""
-    return body_properties(jdate, body)[4]
+    return all_properties(jdate)[body, 4]
 
 
 def vdist_au(jdate, body):
     """Return the distance speed of the body"""
-    return body_properties(jdate, body)[5]
+    return all_properties(jdate)[body, 5]
+
+
+def motion_flags(jdate, body):
+    """
+    Return two booleans: True if a body is retrograde and True if its latitude
+    is rising
+    """
+    speeds = all_properties(jdate)[body, 3:5]
+    return speeds[0] < 0, speeds[1] > 0
 
 
 def is_retrograde(jdate, body):
     """Return True if a body is retrograde"""
-    return vlong(jdate, body) < 0
+    return motion_flags(jdate, body)[0]
 
 
 def is_ascending(jdate, body):
     """Return True if a body latitude is rising"""
-    return vlat(jdate, body) > 0
+    return motion_flags(jdate, body)[1]
 
 
 def body_sign(b_long):
@@ -145,8 +236,7 @@ def body_sign(b_long):
 
 def positions(jdate, l_bodies=bodies):
     """Return an array of bodies longitude"""
-    bodies_id = l_bodies['id']
-    return array([long(jdate, body) for body in bodies_id])
+    return all_properties(jdate)[l_bodies['id'], 0]
 
 
 def get_aspect(jdate, body1, body2):
@@ -158,50 +248,126 @@ def get_aspect(jdate, body1, body2):
         body1, body2 = body2, body1
     dist = distance(long(jdate, body1),
                     long(jdate, body2))
+    orbs = orb_table[body1, body2]
     for i_asp, aspect in enumerate(aspects['value']):
-        orb = get_orb(body1, body2, i_asp)
-        if i_asp == 0 and dist <= orb:
-            return body1, body2, i_asp, dist
-        elif aspect - orb <= dist <= aspect + orb:
-            return body1, body2, i_asp, aspect - dist
+        gap = aspect - dist
+        if abs(gap) <= orbs[i_asp]:
+            return body1, body2, i_asp, dist if i_asp == 0 else gap
     return None
 
 
+def _bodies_id(l_bodies):
+    """
+    Return the bodies id's as a contiguous int32 array for the compiled scans,
+    which don't check bounds
+    Raise IndexError if an id is out of bodies
+    """
+    bodies_id = ascontiguousarray(l_bodies['id'], dtype=int32)
+    if len(bodies_id) and (bodies_id.min() < 0
+                           or bodies_id.max() >= len(bodies)):
+        raise IndexError(f"bodies id's must be in 0..{len(bodies) - 1}")
+    return bodies_id
+
+
+@njit(types.intp(types.float64[::1], types.int32[::1],
+                 types.float32[:, :, ::1], types.float32[::1],
+                 from_dtype(aspect_dtype)[::1]), cache=True, fastmath=True)
+def _scan_aspects(longs, bodies_id, orbs, values, out):
+    """
+    Scan every pair of bodies for the first aspect within its orb and write
+    it in the out structured array
+    Return the number of aspects found
+    """
+    count = 0
+    n_bodies = len(bodies_id)
+    for i in range(n_bodies):
+        for j in range(i + 1, n_bodies):
+            body1 = min(bodies_id[i], bodies_id[j])
+            body2 = max(bodies_id[i], bodies_id[j])
+            dist = _distance(longs[body1], longs[body2])
+            for i_asp in range(len(values)):
+                gap = values[i_asp] - dist
+                if abs(gap) <= orbs[body1, body2, i_asp]:
+                    out[count]['body1'] = body1
+                    out[count]['body2'] = body2
+                    out[count]['i_asp'] = i_asp
+                    out[count]['orb'] = dist if i_asp == 0 else gap
+                    count += 1
+                    break
+    return count
+
+
 def get_aspects(jdate, l_bodies=bodies):
     """
     Return a structured array of aspects and orb
-    Return None if there's no aspect
+    Return an empty array if there's no aspect
     """
-    bodies_id = l_bodies['id']
-    return array([get_aspect(jdate, *comb) for comb in combs(bodies_id, 2)
-                  if get_aspect(jdate, *comb) is not None],
-                 dtype=[('body1', 'i4'), ('body2', 'i4'), ('i_asp', 'i4'),
-                        ('orb', 'f4')])
+    bodies_id = _bodies_id(l_bodies)
+    result = empty(len(bodies_id) * (len(bodies_id) - 1) // 2,
+                   dtype=aspect_dtype)
+    longs = ascontiguousarray(all_properties(jdate)[:, 0])
+    count = _scan_aspects(longs, bodies_id, orb_table, aspect_values, result)
+    return result[:count]
+
+
+@njit('void(f4[:, ::1], i4[::1], f4[:, :, ::1], f4[::1], b1[:, :, ::1])',
+      parallel=True, cache=True, fastmath=True)
+def _scan_series(longs, bodies_id, orbs, values, out_mask):
+    """
+    Fill out_mask[date, pair, aspect] with True where a pair of bodies is in
+    aspect, dates being scanned in parallel
+    """
+    n_bodies = len(bodies_id)
+    for i_date in prange(longs.shape[0]):
+        i_pair = 0
+        for i in range(n_bodies):
+            for j in range(i + 1, n_bodies):
+                body1, body2 = bodies_id[i], bodies_id[j]
+                dist = _distance(longs[i_date, body1], longs[i_date, body2])
+                for i_asp in range(len(values)):
+                    out_mask[i_date, i_pair, i_asp] = \
+                        abs(values[i_asp] - dist) <= orbs[body1, body2, i_asp]
+                i_pair += 1
+
+
+def get_aspects_series(jdates, l_bodies=bodies):
+    """
+    Return a boolean array of shape (dates, pairs, aspects), True where a pair
+    of bodies is in aspect. Pairs are ordered as combinations of l_bodies
+    """
+    bodies_id = _bodies_id(l_bodies)
+    longs = all_properties_series(jdates)[:, :, 0].astype(float32)
+    n_pairs = len(bodies_id) * (len(bodies_id) - 1) // 2
+    hits = empty((len(jdates), n_pairs, len(aspect_values)), dtype=bool)
+    _scan_series(longs, bodies_id, orb_table, aspect_values, hits)
+    return hits
 
 
 # TODO: find exact aspect
 
 def print_positions(jdate):
     """Function to format and print positions of the bodies for a date"""
-    print('\n')
-    print('------------- Bodies Positions -------------')
-    for index, pos in ndenumerate(positions(jdate)):
+    lines = ['\n', '------------- Bodies Positions -------------']
+    props = all_properties(jdate)
+    for body, pos in enumerate(props[:, 0]):
         sign, degs, mins, secs = body_sign(pos)
-        retro = ', R' if is_retrograde(jdate, *index) else ''
-        print(f"{body_name(*index):10}: "
-              f"{signs[sign]:15}{degs:>2}º{mins:>2}'{secs:>2}\"{retro}")
+        retro = ', R' if props[body, 3] < 0 else ''
+        lines.append(f"{body_names[body]:10}: {signs[sign]:15}"
+                     f"{degs:>2}º{mins:>2}'{secs:>2}\"{retro}")
+    print('\n'.join(lines))
 
 
 def print_aspects(jdate):
     """Function to format and print aspects between the bodies for a date"""
-    print('\n')
-    print('------------- Bodies Aspects -------------')
-    for aspect in get_aspects(jdate):
-        body1, body2, i_asp, orb = aspect
-        degs, mins, secs = dd_to_dms(orb)
-        print(f"{body_name(body1):7} - {body_name(body2):8}: "
-              f"{aspects['name'][i_asp].decode():12} "
-              f"{degs:>2}º{mins:>2}'{secs:>2}\"")
+    lines = ['\n', '------------- Bodies Aspects -------------']
+    asps = get_aspects(jdate)
+    dms = zip(*dd_to_dms_vec(asps['orb']))
+    for body1, body2, i_asp, (degs, mins, secs) in zip(
+            asps['body1'], asps['body2'], asps['i_asp'], dms):
+        lines.append(f"{body_names[body1]:7} - {body_names[body2]:8}: "
+                     f"{aspect_names[i_asp]:12} "
+                     f"{degs:>2}º{mins:>2}'{secs:>2}\"")
+    print('\n'.join(lines))
 
 
 def main():
@@ -217,7 +383,3 @@ def main():
     jday = utc_to_julian(dtime)
     print_positions(jday)
     print_aspects(jday)
-
-
-if __name__ == '__main__':
-    main()
@@ -0,0 +1,19 @@
+"""Compile the numba kernels of ketu and write them to the on-disk cache, so
+that later imports and first calls don't pay the compilation cost"""
+
+from numpy import arange
+
+from ketu.ketu import get_aspects, get_aspects_series
+
+# Julian date of 2000-01-01 12:00 UTC, any date would do
+J2000 = 2451545.0
+
+
+def main():
+    """Call each compiled function once on dummy dates"""
+    get_aspects(J2000)
+    get_aspects_series(arange(J2000, J2000 + 2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,17 @@
 from datetime import datetime
+from itertools import combinations
 from unittest import TestCase
 from zoneinfo import ZoneInfo
 
-from numpy import array, where
+from numpy import arange, array, where
 
-from ketu.ketu import (bodies, aspects, signs, dd_to_dms, distance, get_orb,
-                       local_to_utc, utc_to_julian, body_name, body_properties,
-                       body_id, long, lat, dist_au, vlong,
-                       vlat, vdist_au, is_retrograde, is_ascending,
-                       body_sign, positions, get_aspect, get_aspects)
+from ketu.ketu import (bodies, aspects, orb_table, signs, dd_to_dms,
+                       dd_to_dms_vec, distance, distance_vec, get_orb,
+                       local_to_utc, utc_to_julian, body_name, all_properties,
+                       all_properties_series, body_properties, body_id, long,
+                       lat, dist_au, vlong, vlat, vdist_au, motion_flags,
+                       is_retrograde, is_ascending, body_sign, positions,
+                       get_aspect, get_aspects, get_aspects_series)
 
 zoneinfo = ZoneInfo('Europe/Paris')
 gday = datetime(2020, 12, 21, 19, 20, 0, tzinfo=zoneinfo)
@@ -26,6 +29,11 @@ class KetuTest(TestCase):
         self.assertEqual(len(aspects), 5)
         self.assertEqual(aspects['value'][0], 0)
 
+    def test_orb_table(self):
+        self.assertEqual(orb_table.shape, (11, 11, 5))
+        self.assertAlmostEqual(orb_table[0, 1, 3], 8, delta=0.001)
+        self.assertEqual(orb_table[2, 5, 4], orb_table[5, 2, 4])
+
     def test_signs(self):
         self.assertEqual(len(signs), 12)
         self.assertEqual(signs[2], 'Gemini')
@@ -39,7 +47,19 @@ class KetuTest(TestCase):
         self.assertEqual(utc_to_julian(day_one), 1721425.5)
 
     def test_dd_to_dms(self):
-        self.assertEqual(dd_to_dms(271.45).all(), array((271, 27, 0)).all())
+        self.assertEqual(dd_to_dms(271.45), (271, 27, 0))
+        self.assertEqual(dd_to_dms(-1.5), (-2, 30, 0))
+        self.assertEqual(dd_to_dms(-1.5 - 1 / 7200), (-2, 29, 59))
+
+    def test_dd_to_dms_vec(self):
+        degs, mins, secs = dd_to_dms_vec(array((271.45, 10.5)))
+        self.assertEqual(list(degs), [271, 10])
+        self.assertEqual(list(mins), [27, 30])
+        self.assertEqual(list(secs), [0, 0])
+        degs, mins, secs = dd_to_dms_vec(array((-1.5, -1.5 - 1 / 7200)))
+        self.assertEqual(list(degs), [-2, -2])
+        self.assertEqual(list(mins), [30, 29])
+        self.assertEqual(list(secs), [0, 59])
 
     def test_distance(self):
         # Test reflexivity of distance
@@ -48,11 +68,33 @@ class KetuTest(TestCase):
                          dist(long(jday, 1), long(jday, 0)))
         self.assertAlmostEqual(dist(long(jday, 0), long(jday, 1)), 90, delta=3)
 
+    def test_distance_vec(self):
+        longs = positions(jday)
+        dists = distance_vec(longs[[0, 5]], longs[[1, 6]])
+        self.assertAlmostEqual(dists[0], distance(longs[0], longs[1]))
+        self.assertAlmostEqual(dists[1], distance(longs[5], longs[6]))
+        self.assertEqual(distance_vec(array([10.]), array([350.]))[0], 20)
+        self.assertEqual(distance_vec(10., 350.), 20)
+        self.assertEqual(distance_vec(array(10.), array(200.)), 170)
+
     def test_get_orb(self):
         self.assertAlmostEqual(get_orb(0, 1, 3), 8, delta=0.001)
 
     def test_body_name(self):
         self.assertEqual('Sun', body_name(0))
+        self.assertEqual('Rahu', body_name(10))
+
+    def test_all_properties(self):
+        props = all_properties(jday)
+        self.assertEqual(props.shape, (11, 6))
+        self.assertAlmostEqual(props[0, 0], 270, delta=1)
+        self.assertFalse(props.flags.writeable)
+
+    def test_all_properties_series(self):
+        props = all_properties_series(arange(jday, jday + 10))
+        self.assertEqual(props.shape, (10, 11, 6))
+        self.assertTrue((props[0] == all_properties(jday)).all())
+        self.assertTrue((props[:, 10, 3] < 0).all())
 
     def test_body_properties(self):
         self.assertAlmostEqual(body_properties(jday, 0)[0], 270, delta=1)
@@ -79,6 +121,11 @@ class KetuTest(TestCase):
     def test_vdist_au(self):
         self.assertAlmostEqual(vdist_au(jday, 0), 0, delta=0.1)
 
+    def test_motion_flags(self):
+        self.assertEqual(motion_flags(jday, 7),
+                         (is_retrograde(jday, 7), is_ascending(jday, 7)))
+        self.assertTrue(motion_flags(jday, 10)[0])
+
     def test_is_retrograde(self):
         self.assertTrue(is_retrograde(jday, 7))
         self.assertTrue(is_retrograde(jday, 10))
@@ -105,6 +152,49 @@ class KetuTest(TestCase):
         self.assertEqual(body2, 6)
         self.assertEqual(aspect, 0)
         self.assertAlmostEqual(orb, 0, delta=1)
+        l_bodies = array([('Sun', 0, 12), ('X', 11, 5), ('Y', 40, 5)],
+                         dtype=bodies.dtype)
+        with self.assertRaises(IndexError):
+            get_aspects(jday, l_bodies)
+
+    def test_get_aspects_get_aspect(self):
+        # Both compute in float64, orbs are stored in float32
+        for jdate in arange(jday, jday + 30, 0.5):
+            asps = {(asp['body1'], asp['body2']): asp
+                    for asp in get_aspects(jdate)}
+            for body1, body2 in combinations(bodies['id'], 2):
+                aspect = get_aspect(jdate, body1, body2)
+                asp = asps.get((body1, body2))
+                self.assertEqual(aspect is None, asp is None)
+                if aspect is not None:
+                    self.assertEqual(aspect[2], asp['i_asp'])
+                    self.assertAlmostEqual(aspect[3], asp['orb'], delta=1e-5)
+
+    def test_get_aspects_reversed_bodies(self):
+        asps = get_aspects(jday, bodies[::-1])
+        self.assertTrue((asps['body1'] < asps['body2']).all())
+        self.assertEqual(sorted(asps.tolist()),
+                         sorted(get_aspects(jday).tolist()))
+
+    def test_get_aspects_int64_ids(self):
+        l_bodies = bodies.astype([('name', 'S12'), ('id', 'i8'),
+                                  ('orb', 'f4')])
+        self.assertEqual(get_aspects(jday, l_bodies).tolist(),
+                         get_aspects(jday).tolist())
+        self.assertTrue((get_aspects_series([jday], l_bodies)
+                         == get_aspects_series([jday])).all())
+
+    def test_get_aspects_series(self):
+        hits = get_aspects_series(arange(jday, jday + 10))
+        self.assertEqual(hits.shape, (10, 55, 5))
+        asps = get_aspects(jday)
+        pairs, i_asps = hits[0].nonzero()
+        self.assertEqual(len(pairs), len(asps))
+        self.assertTrue((i_asps == asps['i_asp']).all())
+        l_bodies = array([('Sun', 0, 12), ('X', 11, 5), ('Y', 40, 5)],
+                         dtype=bodies.dtype)
+        with self.assertRaises(IndexError):
+            get_aspects_series([jday], l_bodies)
 
     def test_is_applicative(self):
         pass  # in dev mode